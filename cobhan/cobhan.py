@@ -1,42 +1,300 @@
 """Cobhan FFI primary functionality"""
 
+import contextlib
+import functools
 import json
 import os
 import pathlib
-import platform
+import struct
+import sys
+import threading
 from io import UnsupportedOperation
-from typing import Any, ByteString, Optional
+from types import ModuleType
+from typing import Any, ByteString, Dict, Iterator, Optional, Set, Tuple, Union
 
 from cffi import FFI
 
+_orjson: Optional[ModuleType]
+try:
+    import orjson
+except ImportError:
+    _orjson = None
+    _ORJSON_OPTIONS = 0
+else:
+    _orjson = orjson
+    # Also accept the non-string dict keys that json.dumps accepts
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+# Maps digits to "0" and every other byte to a space, so that runs of digits
+# can be found with a substring search
+_DIGIT_RUNS_TABLE = bytes(0x30 if 0x30 <= i <= 0x39 else 0x20 for i in range(256))
+# Integers outside 64 bits have at least this many digits
+_LONG_DIGIT_RUN = b"0" * 19
+
+
+def _dumps_bytes(obj: Any) -> bytes:
+    """Serialize an object into utf8 encoded JSON.
+
+    orjson is used if it is installed. Objects which orjson cannot serialize,
+    such as integers beyond 64 bits, are serialized with the json module. So
+    are objects whose orjson output contains null, as orjson also writes NaN
+    and infinite floats as null.
+
+    :param obj: The object to be serialized
+    :returns: The JSON serialized object
+    """
+    if _orjson is not None:
+        try:
+            data = _orjson.dumps(obj, option=_ORJSON_OPTIONS)
+        except TypeError:
+            pass
+        else:
+            if b"null" not in data:
+                return data
+            try:
+                return json.dumps(obj).encode("utf8")
+            except TypeError:
+                # Only orjson can serialize this object, such as a numpy array
+                return data
+    return json.dumps(obj).encode("utf8")
+
+
+def _loads(data: Union[bytes, bytearray]) -> Any:
+    """Deserialize utf8 encoded JSON into an object.
+
+    orjson is used if it is installed. Documents which orjson rejects, such as
+    ones containing NaN or Infinity, are deserialized with the json module. So
+    are documents with a run of digits long enough to be an integer beyond 64
+    bits, which orjson would read as a float.
+
+    :param data: The JSON to be deserialized
+    :returns: The deserialized object
+    """
+    if _orjson is not None and _LONG_DIGIT_RUN not in data.translate(_DIGIT_RUNS_TABLE):
+        try:
+            return _orjson.loads(data)
+        except _orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
 # Pending https://github.com/python/typing/issues/593
 CBuf = bytearray  # Cobhan buffer
 FFILibrary = Any
 
 
+@functools.lru_cache(maxsize=1)
+def _detect_platform() -> Tuple[str, str]:
+    """Detect the current operating system and CPU architecture.
+
+    :returns: A tuple of `sys.platform` and the machine type
+    """
+    system = sys.platform
+    if system.startswith("win"):
+        machine = os.environ.get("PROCESSOR_ARCHITECTURE", "")
+    elif hasattr(os, "uname"):
+        machine = os.uname().machine
+    else:
+        machine = ""
+
+    if not machine:
+        import platform  # pylint: disable=import-outside-toplevel
+
+        machine = platform.machine()
+
+    return system, machine
+
+
+@functools.lru_cache(maxsize=1)
+def _is_musl() -> bool:
+    """Detect whether the current system uses the musl C library."""
+    return pathlib.Path("/lib").match("libc.musl*")
+
+
+# Library file name parts by `sys.platform` and by machine type
+_OS_EXTENSIONS = {"linux": ".so", "darwin": ".dylib", "win32": ".dll"}
+_ARCH_PARTS = {
+    "x86_64": "-x64",
+    "AMD64": "-x64",
+    "arm64": "-arm64",
+    "aarch64": "-arm64",
+    "ARM64": "-arm64",
+}
+
+
+@functools.lru_cache(maxsize=1)
+def _library_suffix() -> Tuple[str, bool]:
+    """Determine how libraries are named and loaded on the current platform.
+
+    :returns: A tuple of the file name suffix for the CPU arch and operating
+      system, and whether the library directory must be the working
+      directory while the library is loaded
+    :raises UnsupportedOperation: If the operating system or CPU arch are
+      not supported
+    """
+    system, machine = _detect_platform()
+    try:
+        os_ext = _OS_EXTENSIONS[system]
+    except KeyError:
+        raise UnsupportedOperation("Unsupported operating system") from None
+    try:
+        arch_part = _ARCH_PARTS[machine]
+    except KeyError:
+        raise UnsupportedOperation(f"Unsupported CPU: {machine}") from None
+
+    need_chdir = False
+    if system == "linux" and _is_musl():
+        os_ext = "-musl.so"
+        need_chdir = True
+
+    return f"{arch_part}{os_ext}", need_chdir
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_ffi() -> FFI:
+    """Get the FFI instance that all Cobhan instances use to handle buffers.
+
+    Buffer handling only needs cffi's built-in types, so one instance can be
+    shared instead of constructing a new FFI for every Cobhan.
+    """
+    return FFI()
+
+
+# Parsed C definitions and loaded libraries, shared between all Cobhan
+# instances and guarded by _LOAD_LOCK. Instances whose first load uses the same
+# definitions share one FFI, which later loads extend with their definitions.
+_CDEF_CACHE: Dict[str, FFI] = {}
+_FFI_CDEFINES: Dict[FFI, Set[str]] = {}
+_DLOPEN_CACHE: Dict[Tuple[FFI, Optional[str]], FFILibrary] = {}
+_LOAD_LOCK = threading.Lock()
+
+
+def _cdef_ffi(ffi: Optional[FFI], cdefines: str) -> FFI:
+    """Get an FFI instance with the given C definitions registered.
+
+    Parsing C definitions is expensive, so the definitions of a first load are
+    only parsed once per process. The caller must hold `_LOAD_LOCK`.
+
+    :param ffi: The FFI instance used by earlier loads, or None for a first load
+    :param cdefines: A declaration of the C types, functions, and globals
+    :returns: `ffi`, or the cached FFI instance for a first load, on which
+      `cdefines` have been registered
+    """
+    if ffi is None:
+        ffi = _CDEF_CACHE.get(cdefines)
+        if ffi is None:
+            ffi = FFI()
+            ffi.cdef(cdefines)
+            _CDEF_CACHE[cdefines] = ffi
+            _FFI_CDEFINES[ffi] = {cdefines}
+        return ffi
+
+    registered = _FFI_CDEFINES[ffi]
+    if cdefines not in registered:
+        ffi.cdef(cdefines)
+        registered.add(cdefines)
+    return ffi
+
+
+def _dlopen(library_file_path: Optional[str], ffi: FFI) -> FFILibrary:
+    """Load a library, reusing the handle if it has already been loaded.
+
+    The caller must hold `_LOAD_LOCK`.
+
+    :param library_file_path: The full file path to the library, a bare file
+      name to be found on the library search path, or None for the C library
+    :param ffi: The FFI instance on which the library's definitions are
+      registered
+    :returns: The loaded library
+    """
+    library_key = library_file_path
+    if library_key is not None and os.path.dirname(library_key):
+        # Unlike realpath, abspath does not stat every path component. dlopen
+        # itself still recognizes a library reached through a symlink as loaded.
+        library_key = os.path.abspath(library_key)
+    key = (ffi, library_key)
+    lib = _DLOPEN_CACHE.get(key)
+    if lib is None:
+        lib = ffi.dlopen(library_file_path)
+        _DLOPEN_CACHE[key] = lib
+    return lib
+
+
+@functools.lru_cache(maxsize=128)
+def _resolve_library_file(library_path: str, file_name: str) -> str:
+    """Build the resolved path of a library file.
+
+    :param library_path: The absolute path of the library directory
+    :param file_name: The platform-specific file name of the library
+    :returns: The full file path to the library
+    """
+    return f"{os.path.realpath(library_path)}{os.sep}{file_name}"
+
+
+@contextlib.contextmanager
+def _chdir(path: str) -> Iterator[None]:
+    """Temporarily change the working directory.
+
+    :param path: The directory to change into
+    """
+    old_dir = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old_dir)
+
+
+# The Cobhan buffer layout: a header holding the little-endian int32 length
+# of the payload and a reserved int32, followed by the payload
+_SIZEOF_INT32 = struct.calcsize("<i")
+_SIZEOF_HEADER = _SIZEOF_INT32 * 2
+_pack_int32 = struct.Struct("<i").pack
+_unpack_int32 = struct.Struct("<i").unpack
+# The length and the reserved zero field, as one 8-byte store. Lengths that
+# do not fit into the int32 field raise struct.error rather than wrapping.
+_pack_header = struct.Struct("<i4x").pack
+# The largest payload the int32 length field can describe
+_MAX_PAYLOAD_SIZE = 2**31 - 1
+_pack_int64 = struct.Struct("<q").pack
+_unpack_int64 = struct.Struct("<q").unpack_from
+
+# The payload capacity of the smallest buffers, which are the ones pooled
+_MINIMUM_PAYLOAD_SIZE = 1024
+# The number of released minimum size buffers kept for reuse per instance
+_MAX_POOLED_BUFFERS = 16
+# Written over released buffers, so that a reused buffer is zero-filled like a
+# new one and does not hand the previous payload to its next user
+_ZERO_MINIMUM_BUFFER = bytes(_SIZEOF_HEADER + _MINIMUM_PAYLOAD_SIZE)
+# The payload size from which decoding through an ffi.buffer view is faster
+# than copying the payload out first
+_MINIMUM_BUFFER_DECODE_SIZE = 8192
+
+
 class Cobhan:
     """Class representing the Cobhan translation layer"""
 
     def __init__(self):
         self._lib: Optional[FFILibrary] = None
-        self.__ffi: FFI = FFI()
-        self.__sizeof_int32: int = self.__ffi.sizeof("int32_t")
-        self.__sizeof_int64: int = self.__ffi.sizeof("int64_t")
-        self.__sizeof_header: int = self.__sizeof_int32 * 2
-        self.__minimum_payload_size: int = 1024
-        self.__int32_zero_bytes: bytes = int(0).to_bytes(
-            self.__sizeof_int32, byteorder="little", signed=True
-        )
+        # The FFI shared by all libraries loaded through this instance
+        self.__lib_ffi: Optional[FFI] = None
+        self.__ffi: FFI = _shared_ffi()
+        self.__minimum_payload_size: int = _MINIMUM_PAYLOAD_SIZE
+        self.__minimum_allocation: int = self.__minimum_payload_size + _SIZEOF_HEADER
+        self.__char_array_t = self.__ffi.typeof("char[]")
+        # Released minimum size buffers available for reuse, keyed by id() so
+        # that a buffer which is released twice is only pooled once
+        self.__pool: Dict[int, CBuf] = {}
 
     @property
     def minimum_allocation(self):
         """The minimum buffer size, in bytes, that will be allocated for a string"""
-        return self.__minimum_payload_size + self.header_size
+        return self.__minimum_allocation
 
     @property
     def header_size(self):
         """The size, in bytes, of a buffer's header"""
-        return self.__sizeof_header
+        return _SIZEOF_HEADER
 
     def load_library(
         self, library_path: str, library_name: str, cdefines: str
@@ -51,47 +309,17 @@ class Cobhan:
         :raises UnsupportedOperation: If the operating system or CPU arch are
           not supported
         """
-        self.__ffi.cdef(cdefines)
-
-        system = platform.system()
-        need_chdir = False
-        if system == "Linux":
-            if pathlib.Path("/lib").match("libc.musl*"):
-                os_ext = "-musl.so"
-                need_chdir = True
-            else:
-                os_ext = ".so"
-        elif system == "Darwin":
-            os_ext = ".dylib"
-        elif system == "Windows":
-            os_ext = ".dll"
-        else:
-            raise UnsupportedOperation("Unsupported operating system")
-
-        machine = platform.machine()
-        if machine in ("x86_64", "AMD64"):
-            arch_part = "-x64"
-        elif machine in ("arm64", "aarch64"):
-            arch_part = "-arm64"
-        else:
-            raise UnsupportedOperation(f"Unsupported CPU: {machine}")
-
-        # Get absolute library path
-        resolved_library_path = pathlib.Path(library_path).resolve()
-
-        # Build library path with file name
-        library_file_path = os.path.join(
-            str(resolved_library_path), f"{library_name}{arch_part}{os_ext}"
+        suffix, need_chdir = _library_suffix()
+        library_dir = library_path
+        if not os.path.isabs(library_dir):
+            # Relative paths are resolved against the current working directory
+            library_dir = os.path.abspath(library_dir)
+        library_file_path = _resolve_library_file(
+            library_dir, f"{library_name}{suffix}"
         )
 
-        if need_chdir:
-            old_dir = os.getcwd()
-            os.chdir(library_path)
-
-        self._lib = self.__ffi.dlopen(library_file_path)
-
-        if need_chdir:
-            os.chdir(old_dir)
+        with _chdir(library_path) if need_chdir else contextlib.nullcontext():
+            self.__load(library_file_path, cdefines)
 
         return self._lib
 
@@ -102,22 +330,40 @@ class Cobhan:
         want the `load_library` method which will load a platform-specific
         library for you.
 
+        All libraries loaded through one instance share their definitions, so
+        types declared by an earlier load can be used by later ones. A library
+        is only opened once for those definitions; later loads of the same
+        file return the same library.
+
         :param library_file_path: The full file path to the library
         :param cdefines: A declaration of the C types, functions, and globals
           globals needed to use the shared object. This must be valid C syntax,
           with one definition per line.
         """
-        self.__ffi.cdef(cdefines)
-        self._lib = self.__ffi.dlopen(library_file_path)
+        self.__load(library_file_path, cdefines)
         return self._lib
 
+    def __load(self, library_file_path: str, cdefines: str) -> None:
+        """Load a library with the C definitions of this and earlier loads.
+
+        :param library_file_path: The full file path to the library
+        :param cdefines: A declaration of the C types, functions, and globals
+        """
+        with _LOAD_LOCK:
+            ffi = _cdef_ffi(self.__lib_ffi, cdefines)
+            self._lib = _dlopen(library_file_path, ffi)
+            self.__lib_ffi = ffi
+
     def to_json_buf(self, obj: Any) -> CBuf:
         """Serialize an object into JSON in a Cobhan buffer.
 
+        If orjson is installed, the JSON may be written without whitespace
+        between items.
+
         :param obj: The object to be serialized
         :returns: A new Cobhan buffer containing the JSON serialized object
         """
-        return self.str_to_buf(json.dumps(obj))
+        return self.bytearray_to_buf(_dumps_bytes(obj))
 
     def from_json_buf(self, buf: CBuf) -> Any:
         """Deserialize a JSON serialized Cobhan buffer into an object.
@@ -125,106 +371,186 @@ class Cobhan:
         :param buf: The Cobhan buffer to be deserialized
         :returns: The deserialized object
         """
-        return json.loads(self.buf_to_str(buf))
+        return _loads(self.buf_to_bytearray(buf))
 
-    def __get_length(self, buf: CBuf) -> int:
-        length_buf = self.__ffi.unpack(buf, self.__sizeof_int32)
-        return int.from_bytes(length_buf, byteorder="little", signed=True)
+    def __set_length_only(self, buf: CBuf, length: int) -> None:
+        """Write only the length field of a zero-filled Cobhan buffer.
 
-    def __set_header(self, buf: CBuf, length: int) -> None:
-        """Create a header in a Cobhan buffer.
+        The reserved half of the header is left untouched, as it already
+        holds zero.
 
-        :param buf: The Cobhan buffer in which to create a header
-        :param length: The length of the header to be created
+        :param buf: The zero-filled Cobhan buffer in which to set the length
+        :param length: The length to be written
         """
-        length_bytes = length.to_bytes(self.__sizeof_int32, byteorder="little", signed=True)
-        buf[0:self.__sizeof_int32] = length_bytes
-        buf[self.__sizeof_int32:self.__sizeof_header] = self.__int32_zero_bytes
-
-    def __get_payload_slice(self, buf: bytearray, length: int) -> bytearray:
-        return buf[self.__sizeof_header:self.__sizeof_header + length]
+        buf[0:_SIZEOF_INT32] = _pack_int32(length)
 
-    def __set_payload(self, buf: CBuf, payload: bytearray, length: int) -> None:
+    def __set_payload(self, buf: CBuf, payload: ByteString, length: int) -> None:
         """Copy a payload into a Cobhan buffer.
 
         :param buf: The Cobhan buffer to copy the payload into
         :param payload: The payload to be copied
         :param length: The length of the payload
         """
-        self.__set_header(buf, length)
-        buf[self.__sizeof_header:self.__sizeof_header + length] = payload
+        buf[0:_SIZEOF_HEADER] = _pack_header(length)
+        buf[_SIZEOF_HEADER : _SIZEOF_HEADER + length] = payload
 
-    def bytearray_to_buf(self, payload: bytearray) -> Any:
+    def bytearray_to_buf(self, payload: Optional[ByteString]) -> Any:
         """Copy a bytearray to a Cobhan buffer.
 
         :param payload: The bytearray to be copied
+        :raises OverflowError: If the payload is too large for a Cobhan buffer
         """
         if payload is None:
             return self.allocate_buf(0)
         length = len(payload)
-        buf = self.allocate_buf(length)
+        if not length:
+            # A new buffer is zero-filled, so its header already reads as empty
+            return self.__ffi.new(self.__char_array_t, self.__minimum_allocation)
+        minimum = self.__minimum_payload_size
+        buf = self.__new_buf(length if length > minimum else minimum)
         self.__set_payload(buf, payload, length)
         return buf
 
     def str_to_buf(self, string: Optional[str]) -> Any:
         """Encode a string in utf8 and copy into a Cobhan buffer.
 
+        An empty string or None gives a minimum size buffer whose length field
+        covers its whole zero-filled payload, as for `allocate_buf(0)`.
+
         :param string: The string to be copied
         :returns: A new Cobhan buffer containing the utf8 encoded string
+        :raises OverflowError: If the payload is too large for a Cobhan buffer
         """
         if not string:
             return self.allocate_buf(0)
-        encoded_bytes = string.encode("utf8")
+        # Without an explicit encoding name, CPython skips the codec lookup and
+        # goes straight to its UTF-8 encoder, which copies ASCII directly
+        encoded_bytes = string.encode()
+        length = len(encoded_bytes)
+        minimum = self.__minimum_payload_size
+        buf = self.__new_buf(length if length > minimum else minimum)
+        self.__set_payload(buf, encoded_bytes, length)
+        return buf
+
+    def str_to_buf_into(self, string: Optional[str], buf: CBuf) -> CBuf:
+        """Encode a string in utf8 and copy it into an existing Cobhan buffer.
+
+        This allows a caller to reuse one buffer across calls, rather than
+        allocating a new buffer for every string. If the encoded string does
+        not fit into `buf`, a new buffer is allocated instead. As with
+        `str_to_buf`, an empty string or None zero-fills the whole payload of
+        `buf`, and the length field covers all of it.
+
+        :param string: The string to be copied
+        :param buf: The Cobhan buffer to copy the string into
+        :returns: `buf`, or a new Cobhan buffer if the string did not fit
+        :raises OverflowError: If the payload is too large for a Cobhan buffer
+        """
+        if not string:
+            capacity = len(buf) - _SIZEOF_HEADER
+            self.__set_payload(buf, bytes(capacity), capacity)
+            return buf
+        encoded_bytes = string.encode()
         length = len(encoded_bytes)
-        buf = self.allocate_buf(length)
+        if length > len(buf) - _SIZEOF_HEADER:
+            minimum = self.__minimum_payload_size
+            buf = self.__new_buf(length if length > minimum else minimum)
         self.__set_payload(buf, encoded_bytes, length)
         return buf
 
     def allocate_buf(self, buffer_len: int) -> CBuf:
         """Allocate a new Cobhan buffer.
 
+        If a minimum size buffer is requested and one has been returned with
+        `release_buf`, it is reused instead of allocating a new one. Either
+        way the payload of the returned buffer is zero-filled.
+
         :param buffer_len: The length of the buffer to be allocated
         :returns: A new Cobhan buffer of the specified length
+        :raises OverflowError: If the length is too large for a Cobhan buffer
         """
-        length = max(buffer_len, self.__minimum_payload_size)
-        buf = self.__ffi.new(f"char[{self.__sizeof_header + length}]")
-        self.__set_header(buf, length)
+        minimum = self.__minimum_payload_size
+        length = buffer_len if buffer_len > minimum else minimum
+        buf = self.__new_buf(length)
+        self.__set_length_only(buf, length)
         return buf
 
-    def buf_to_str(self, buf: CBuf) -> str:
+    def __new_buf(self, length: int) -> CBuf:
+        """Get a zero-filled Cobhan buffer with the given payload capacity.
+
+        :param length: The payload capacity of the buffer
+        :returns: A new or pooled buffer, with its header still zero
+        :raises OverflowError: If the capacity does not fit into the length
+          field of the header
+        """
+        if length == self.__minimum_payload_size and self.__pool:
+            try:
+                return self.__pool.popitem()[1]
+            except KeyError:
+                # Another thread took the last pooled buffer
+                pass
+        if length > _MAX_PAYLOAD_SIZE:
+            raise OverflowError(f"Cobhan buffers cannot hold {length} bytes")
+        return self.__ffi.new(self.__char_array_t, _SIZEOF_HEADER + length)
+
+    def release_buf(self, buf: CBuf) -> None:
+        """Return a Cobhan buffer to the pool for reuse by `allocate_buf`.
+
+        The buffer must not be used after it has been released, as it may be
+        handed out again by any later allocation of the minimum size. Only
+        minimum size buffers are pooled, and only up to a fixed number of them;
+        other buffers are freed as usual once they are no longer referenced.
+        Pooled buffers are owned by this Cobhan instance and freed along with
+        it. Releasing a buffer which is already pooled has no effect, and
+        objects which were not allocated as Cobhan buffers are never pooled.
+        The contents of a released buffer are cleared.
+
+        :param buf: The Cobhan buffer to be released
+        """
+        ffi = self.__ffi
+        pool = self.__pool
+        if (
+            len(pool) < _MAX_POOLED_BUFFERS
+            and isinstance(buf, ffi.CData)
+            and ffi.typeof(buf) is self.__char_array_t
+            and len(buf) == self.__minimum_allocation
+        ):
+            buf[0 : self.__minimum_allocation] = _ZERO_MINIMUM_BUFFER
+            pool[id(buf)] = buf
+
+    def buf_to_str(self, buf: Any, encoding: str = "utf8") -> str:
         """Read a Cobhan buffer into a string.
 
         :param buf: The Cobhan buffer to be read
+        :param encoding: The encoding of the buffer contents. Callers that
+          know the contents are pure ASCII can pass "ascii" to skip UTF-8
+          validation.
         :returns: The string contents of the buffer
         """
-        encoded_bytes = self.buf_to_bytearray(buf)
-        return encoded_bytes.decode("utf8")
+        ffi = self.__ffi
+        length = _unpack_int32(ffi.unpack(buf, _SIZEOF_INT32))[0]
+        if length < 0:
+            return self.__temp_to_bytearray(buf, length).decode(encoding)
+
+        if length < _MINIMUM_BUFFER_DECODE_SIZE:
+            return ffi.unpack(buf + _SIZEOF_HEADER, length).decode(encoding)
+        # Decode straight from the buffer's memory, without an intermediate copy
+        return str(ffi.buffer(buf + _SIZEOF_HEADER, length), encoding)
 
-    def buf_to_bytearray(self, buf: CBuf) -> bytearray:
+    def buf_to_bytearray(self, buf: Any) -> bytearray:
         """Copy a Cobhan buffer into a bytearray.
 
         :param buf: The Cobhan buffer to be copied
         :returns: The bytearray contents of the buffer
         """
-        length = self.__get_length(buf)
+        ffi = self.__ffi
+        length = _unpack_int32(ffi.unpack(buf, _SIZEOF_INT32))[0]
         if length < 0:
             return self.__temp_to_bytearray(buf, length)
 
-        payload = self.__ffi.unpack(buf[self.__sizeof_header:self.__sizeof_header + length] , length)
-
-        return payload
-
-    def __temp_to_str(self, buf: CBuf, length: int) -> str:
-        """Copy a temporary file backed Cobhan buffer into a string.
-
-        :param buf: The Cobhan buffer to be read from
-        :param length: The length of the file name of the temporary file
-        :returns: The string contents copied from the buffer
-        """
-        encoded_bytes = self.__temp_to_bytearray(buf, length)
-        return encoded_bytes.decode("utf8")
+        return ffi.unpack(buf + _SIZEOF_HEADER, length)
 
-    def __temp_to_bytearray(self, buf: CBuf, length: int) -> bytearray:
+    def __temp_to_bytearray(self, buf: Any, length: int) -> bytearray:
         """Copy a temporary file backed Cobhan buffer into a bytearray.
 
         :param buf: The Cobhan buffer to be copied
@@ -232,11 +558,19 @@ class Cobhan:
         :returns: The bytearray contents copied from the buffer
         """
         length = 0 - length
-        payload = self.__ffi.unpack(buf[self.__sizeof_header:self.__sizeof_header + length], length)
-        file_name = payload.decode("utf8")
-        with open(file_name, "rb") as binaryfile:
-            payload = bytearray(binaryfile.read())
-        os.remove(file_name)
+        file_name = self.__ffi.unpack(buf + _SIZEOF_HEADER, length).decode("utf8")
+        # Read straight into a preallocated bytearray, rather than copying the
+        # file contents out of an intermediate bytes object
+        payload = bytearray(os.path.getsize(file_name))
+        offset = 0
+        with open(file_name, "rb") as binaryfile, memoryview(payload) as view:
+            while offset < len(payload):
+                read = binaryfile.readinto(view[offset:])
+                if not read:
+                    break
+                offset += read
+        del payload[offset:]
+        os.unlink(file_name)
         return payload
 
     def int_to_buf(self, num: int) -> CBuf:
@@ -245,7 +579,7 @@ class Cobhan:
         :param num: The integer to be copied
         :returns: A new Cobhan buffer containing the integer
         """
-        return bytearray(num.to_bytes(self.__sizeof_int64, byteorder="little", signed=True))
+        return bytearray(_pack_int64(num))
 
     def buf_to_int(self, buf: CBuf) -> int:
         """Read a Cobhan buffer into an integer.
@@ -253,4 +587,4 @@ class Cobhan:
         :param buf: The Cobhan buffer to be read
         :returns: The integer contents of the buffer
         """
-        return int.from_bytes(buf[0:self.__sizeof_int64], byteorder="little", signed=True)
+        return _unpack_int64(buf)[0]
@@ -1,88 +1,218 @@
 # pylint: disable=missing-function-docstring,missing-class-docstring,missing-module-docstring
 
-from pathlib import Path
+import ctypes.util
+import math
+import os
+import tempfile
+from io import UnsupportedOperation
+from typing import Any, Tuple
 from unittest import mock, TestCase
 
 from cobhan import Cobhan
+from cobhan.cobhan import _detect_platform, _library_suffix, _shared_ffi
 
 
+@mock.patch.dict("cobhan.cobhan._DLOPEN_CACHE", clear=True)
+@mock.patch.dict("cobhan.cobhan._CDEF_CACHE", clear=True)
+@mock.patch.dict("cobhan.cobhan._FFI_CDEFINES", clear=True)
+@mock.patch.dict("cobhan.cobhan.os.environ")
 class LoadLibraryTests(TestCase):
     """Tests for Cobhan.load_library"""
 
     def setUp(self) -> None:
-        self.ffi_patcher = mock.patch("cobhan.cobhan.FFI")
-        self.platform_patcher = mock.patch("cobhan.cobhan.platform")
-
-        self.mock_ffi = self.ffi_patcher.start()
-        self.mock_dlopen = self.mock_ffi.return_value.dlopen
-        self.mock_platform = self.platform_patcher.start()
-
-        self.addCleanup(self.ffi_patcher.stop)
-        self.addCleanup(self.platform_patcher.stop)
+        self.addCleanup(_detect_platform.cache_clear)
+        self.addCleanup(_library_suffix.cache_clear)
+        _detect_platform.cache_clear()
+        _library_suffix.cache_clear()
 
         self.cobhan = Cobhan()
         return super().setUp()
 
-    def test_load_linux_x64(self):
-        self.mock_platform.system.return_value = "Linux"
-        self.mock_platform.machine.return_value = "x86_64"
-
-        self.cobhan.load_library("libfoo", "libbar", "")
-        self.mock_dlopen.assert_called_once_with(
-            str(Path("libfoo/libbar-x64.so").resolve())
+    @staticmethod
+    def library_file_path(file_name: str) -> str:
+        return os.path.join(os.path.realpath("libfoo"), file_name)
+
+    @mock.patch("cobhan.cobhan.FFI")
+    @mock.patch("cobhan.cobhan.sys")
+    @mock.patch("cobhan.cobhan.os.uname", create=True)
+    def test_load_platforms(self, mock_uname, mock_sys, mock_ffi):
+        mock_dlopen = mock_ffi.return_value.dlopen
+        for system, machine, expected in [
+            ("linux", "x86_64", "libbar-x64.so"),
+            ("linux", "aarch64", "libbar-arm64.so"),
+            ("darwin", "x86_64", "libbar-x64.dylib"),
+            ("darwin", "arm64", "libbar-arm64.dylib"),
+            ("win32", "AMD64", "libbar-x64.dll"),
+            ("win32", "ARM64", "libbar-arm64.dll"),
+        ]:
+            with self.subTest(system=system, machine=machine):
+                _detect_platform.cache_clear()
+                _library_suffix.cache_clear()
+                mock_dlopen.reset_mock()
+                mock_sys.platform = system
+                mock_uname.return_value.machine = machine
+                os.environ["PROCESSOR_ARCHITECTURE"] = machine
+
+                self.cobhan.load_library("libfoo", "libbar", "")
+                mock_dlopen.assert_called_once_with(self.library_file_path(expected))
+
+    @mock.patch("cobhan.cobhan.FFI")
+    @mock.patch("cobhan.cobhan.sys")
+    @mock.patch("cobhan.cobhan.os.uname", create=True)
+    def test_load_linux_musl_x64(self, mock_uname, mock_sys, mock_ffi):
+        mock_sys.platform = "linux"
+        mock_uname.return_value.machine = "x86_64"
+
+        with mock.patch("cobhan.cobhan._is_musl", return_value=True), mock.patch(
+            "cobhan.cobhan.os.chdir"
+        ) as mock_chdir:
+            self.cobhan.load_library("libfoo", "libbar", "")
+
+        mock_ffi.return_value.dlopen.assert_called_once_with(
+            self.library_file_path("libbar-x64-musl.so")
         )
-
-    def test_load_linux_arm64(self):
-        self.mock_platform.system.return_value = "Linux"
-        self.mock_platform.machine.return_value = "arm64"
-
-        self.cobhan.load_library("libfoo", "libbar", "")
-        self.mock_dlopen.assert_called_once_with(
-            str(Path("libfoo/libbar-arm64.so").resolve())
+        self.assertEqual(
+            mock_chdir.call_args_list, [mock.call("libfoo"), mock.call(os.getcwd())]
         )
 
-    def test_load_macos_x64(self):
-        self.mock_platform.system.return_value = "Darwin"
-        self.mock_platform.machine.return_value = "x86_64"
-
-        self.cobhan.load_library("libfoo", "libbar", "")
-        self.mock_dlopen.assert_called_once_with(
-            str(Path("libfoo/libbar-x64.dylib").resolve())
+    @mock.patch("cobhan.cobhan.FFI")
+    @mock.patch("cobhan.cobhan.sys")
+    @mock.patch("cobhan.cobhan.os.uname", create=True)
+    def test_load_absolute_path(self, mock_uname, mock_sys, mock_ffi):
+        mock_sys.platform = "linux"
+        mock_uname.return_value.machine = "x86_64"
+        library_path = os.path.realpath("libfoo")
+
+        self.cobhan.load_library(library_path, "libbar", "")
+        mock_ffi.return_value.dlopen.assert_called_once_with(
+            os.path.join(library_path, "libbar-x64.so")
         )
 
-    def test_load_macos_arm64(self):
-        self.mock_platform.system.return_value = "Darwin"
-        self.mock_platform.machine.return_value = "arm64"
+    @mock.patch("cobhan.cobhan.FFI", mock.MagicMock())
+    @mock.patch("cobhan.cobhan.sys")
+    @mock.patch("cobhan.cobhan.os.uname", create=True)
+    def test_load_unsupported_os(self, mock_uname, mock_sys):
+        mock_sys.platform = "sunos5"
+        mock_uname.return_value.machine = "x86_64"
+
+        with self.assertRaises(UnsupportedOperation):
+            self.cobhan.load_library("libfoo", "libbar", "")
+
+    @mock.patch("cobhan.cobhan.FFI", mock.MagicMock())
+    @mock.patch("cobhan.cobhan.sys")
+    @mock.patch("cobhan.cobhan.os.uname", create=True)
+    def test_load_unsupported_cpu(self, mock_uname, mock_sys):
+        mock_sys.platform = "linux"
+        mock_uname.return_value.machine = "riscv64"
+
+        with self.assertRaises(UnsupportedOperation):
+            self.cobhan.load_library("libfoo", "libbar", "")
+
+    @mock.patch("cobhan.cobhan.FFI", mock.MagicMock())
+    @mock.patch("cobhan.cobhan.sys")
+    @mock.patch("cobhan.cobhan.os.uname", create=True)
+    def test_platform_detection_is_cached(self, mock_uname, mock_sys):
+        mock_sys.platform = "linux"
+        mock_uname.return_value.machine = "x86_64"
 
         self.cobhan.load_library("libfoo", "libbar", "")
-        self.mock_dlopen.assert_called_once_with(
-            str(Path("libfoo/libbar-arm64.dylib").resolve())
-        )
-
-    def test_load_windows_x64(self):
-        self.mock_platform.system.return_value = "Windows"
-        self.mock_platform.machine.return_value = "x86_64"
-
-        self.cobhan.load_library("libfoo", "libbar", "")
-        self.mock_dlopen.assert_called_once_with(
-            str(Path("libfoo/libbar-x64.dll").resolve())
-        )
-
-    def test_load_windows_arm64(self):
-        self.mock_platform.system.return_value = "Windows"
-        self.mock_platform.machine.return_value = "arm64"
-
         self.cobhan.load_library("libfoo", "libbar", "")
-        self.mock_dlopen.assert_called_once_with(
-            str(Path("libfoo/libbar-arm64.dll").resolve())
+        mock_uname.assert_called_once_with()
+
+    @mock.patch("cobhan.cobhan.FFI")
+    @mock.patch("cobhan.cobhan.sys")
+    @mock.patch("cobhan.cobhan.os.uname", create=True)
+    def test_cdefines_are_parsed_once(self, mock_uname, mock_sys, mock_ffi):
+        mock_sys.platform = "linux"
+        mock_uname.return_value.machine = "x86_64"
+
+        self.cobhan.load_library("libfoo", "libbar", "int foo();")
+        Cobhan().load_library("libfoo", "libbar", "int foo();")
+        mock_ffi.return_value.cdef.assert_called_once_with("int foo();")
+
+    @mock.patch("cobhan.cobhan.FFI")
+    @mock.patch("cobhan.cobhan.sys")
+    @mock.patch("cobhan.cobhan.os.uname", create=True)
+    def test_repeated_load_hits_cache(self, mock_uname, mock_sys, mock_ffi):
+        mock_sys.platform = "linux"
+        mock_uname.return_value.machine = "x86_64"
+
+        lib = self.cobhan.load_library("libfoo", "libbar", "int foo();")
+        self.assertIs(self.cobhan.load_library("libfoo", "libbar", "int foo();"), lib)
+        self.assertEqual(mock_ffi.return_value.dlopen.call_count, 1)
+
+    @mock.patch("cobhan.cobhan.FFI")
+    def test_repeated_direct_load_reuses_handle(self, mock_ffi):
+        lib = self.cobhan.load_library_direct("libfoo/libbar.so", "int foo();")
+        other = Cobhan().load_library_direct("libfoo/libbar.so", "int foo();")
+        self.assertIs(other, lib)
+        mock_ffi.return_value.dlopen.assert_called_once_with("libfoo/libbar.so")
+
+    @mock.patch("cobhan.cobhan.FFI")
+    def test_direct_load_with_other_cdefines_extends_ffi(self, mock_ffi):
+        lib = self.cobhan.load_library_direct("libfoo/libbar.so", "int foo();")
+        other = self.cobhan.load_library_direct("libfoo/libbar.so", "int bar();")
+        self.assertIs(other, lib)
+        self.assertEqual(
+            mock_ffi.return_value.cdef.call_args_list,
+            [mock.call("int foo();"), mock.call("int bar();")],
         )
+        mock_ffi.return_value.dlopen.assert_called_once_with("libfoo/libbar.so")
+
+    @mock.patch("cobhan.cobhan.FFI")
+    def test_direct_load_of_c_library(self, mock_ffi):
+        lib = self.cobhan.load_library_direct(None, "int foo();")
+        self.assertIs(Cobhan().load_library_direct(None, "int foo();"), lib)
+        mock_ffi.return_value.dlopen.assert_called_once_with(None)
+
+    @mock.patch("cobhan.cobhan.FFI")
+    def test_direct_load_of_bare_name_is_not_made_absolute(self, mock_ffi):
+        lib = self.cobhan.load_library_direct("libbar.so", "int foo();")
+        with mock.patch("cobhan.cobhan.os.getcwd", return_value="/elsewhere"):
+            other = Cobhan().load_library_direct("libbar.so", "int foo();")
+        self.assertIs(other, lib)
+        mock_ffi.return_value.dlopen.assert_called_once_with("libbar.so")
+
+    def test_loaded_libraries_share_c_types(self):
+        libc = ctypes.util.find_library("c")
+        if libc is None:
+            self.skipTest("No C library to load")
+        cdefines = """
+            typedef struct { char a[16]; } foo_t;
+            foo_t *strdup(const char *);
+            void free(void *);
+        """
+        first = self.cobhan.load_library_direct(libc, cdefines)
+        second = self.cobhan.load_library_direct(libc, "size_t strlen(const foo_t *);")
+        copy = first.strdup(b"hello")
+        self.addCleanup(first.free, copy)
+        self.assertEqual(second.strlen(copy), 5)
+        self.assertIs(self.cobhan.load_library_direct(libc, cdefines), first)
+
+
+class SharedFFITests(TestCase):
+    def test_instances_share_ffi(self):
+        with mock.patch("cobhan.cobhan.FFI") as mock_ffi:
+            _shared_ffi.cache_clear()
+            self.addCleanup(_shared_ffi.cache_clear)
+            Cobhan()
+            Cobhan()
+        mock_ffi.assert_called_once_with()
+
+    def test_instance_methods_can_be_patched(self):
+        cobhan = Cobhan()
+        with mock.patch.object(cobhan, "str_to_buf") as mock_str_to_buf:
+            cobhan.str_to_buf("foobar")
+        mock_str_to_buf.assert_called_once_with("foobar")
 
 
 class StringTests(TestCase):
-    def setUp(self) -> None:
+    cobhan: Cobhan
 
-        self.cobhan = Cobhan()
-        return super().setUp()
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.cobhan = Cobhan()
+        return super().setUpClass()
 
     def test_minimum_allocation_is_enforced(self):
         buf = self.cobhan.str_to_buf("foo")
@@ -98,6 +228,22 @@ class StringTests(TestCase):
         result = self.cobhan.buf_to_str(buf)
         self.assertEqual(result, "foobar")
 
+    def test_two_way_conversion_maintains_non_ascii_string(self):
+        buf = self.cobhan.str_to_buf("f\u00f6\u00f6b\u00e4r")
+        result = self.cobhan.buf_to_str(buf)
+        self.assertEqual(result, "f\u00f6\u00f6b\u00e4r")
+
+    def test_two_way_conversion_maintains_long_string(self):
+        long_str = "f\u00f6\u00f6b\u00e4r" * 4000  # 36k bytes once encoded
+        buf = self.cobhan.str_to_buf(long_str)
+        result = self.cobhan.buf_to_str(buf)
+        self.assertEqual(result, long_str)
+
+    def test_ascii_encoding_can_be_requested(self):
+        buf = self.cobhan.str_to_buf("foobar")
+        result = self.cobhan.buf_to_str(buf, encoding="ascii")
+        self.assertEqual(result, "foobar")
+
     def test_empty_string_returns_empty_buffer(self):
         buf = self.cobhan.str_to_buf("")
         self.assertEqual(len(buf), self.cobhan.minimum_allocation)
@@ -106,11 +252,57 @@ class StringTests(TestCase):
         buf = self.cobhan.str_to_buf(None)
         self.assertEqual(len(buf), self.cobhan.minimum_allocation)
 
+    def test_allocation_beyond_int32_length_raises(self):
+        with self.assertRaises(OverflowError):
+            self.cobhan.allocate_buf(2**31)
+
+
+class StringIntoTests(TestCase):
+    cobhan: Cobhan
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.cobhan = Cobhan()
+        return super().setUpClass()
+
+    def test_buffer_is_reused(self):
+        buf = self.cobhan.allocate_buf(0)
+        result = self.cobhan.str_to_buf_into("foobar", buf)
+        self.assertIs(result, buf)
+        self.assertEqual(self.cobhan.buf_to_str(result), "foobar")
+
+    def test_buffer_is_overwritten(self):
+        buf = self.cobhan.str_to_buf("foobar" * 10)
+        self.cobhan.str_to_buf_into("foo", buf)
+        self.assertEqual(self.cobhan.buf_to_str(buf), "foo")
+
+    def test_empty_string_is_written_like_str_to_buf(self):
+        buf = self.cobhan.str_to_buf("foobar")
+        for string in (None, ""):
+            with self.subTest(string=string):
+                self.cobhan.str_to_buf_into(string, buf)
+                self.assertEqual(
+                    self.cobhan.buf_to_str(buf),
+                    self.cobhan.buf_to_str(self.cobhan.str_to_buf(string)),
+                )
+                self.assertEqual(self.cobhan.buf_to_str(buf), "\0" * 1024)
+
+    def test_new_buffer_is_allocated_when_string_does_not_fit(self):
+        long_str = "foobar" * 1000  # This will be 6k characters in length
+        buf = self.cobhan.allocate_buf(0)
+        result = self.cobhan.str_to_buf_into(long_str, buf)
+        self.assertIsNot(result, buf)
+        self.assertEqual(len(result), (len(long_str) + self.cobhan.header_size))
+        self.assertEqual(self.cobhan.buf_to_str(result), long_str)
+
 
 class BytesTests(TestCase):
-    def setUp(self) -> None:
-        self.cobhan = Cobhan()
-        return super().setUp()
+    cobhan: Cobhan
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.cobhan = Cobhan()
+        return super().setUpClass()
 
     def test_minimum_allocation_is_enforced(self):
         data_bytes = "foo".encode("utf8")
@@ -137,3 +329,176 @@ class BytesTests(TestCase):
     def test_input_of_none_returns_empty_buffer(self):
         buf = self.cobhan.bytearray_to_buf(None)
         self.assertEqual(len(buf), self.cobhan.minimum_allocation)
+
+    def test_two_way_conversion_maintains_empty_bytes(self):
+        buf = self.cobhan.bytearray_to_buf(b"")
+        result = self.cobhan.buf_to_bytearray(buf)
+        self.assertEqual(result, b"")
+
+    def test_two_way_conversion_beyond_small_payload(self):
+        data_bytes = bytes(range(256)) * 4
+        buf = self.cobhan.bytearray_to_buf(data_bytes)
+        result = self.cobhan.buf_to_bytearray(buf)
+        self.assertEqual(result, data_bytes)
+
+
+class TempFileTests(TestCase):
+    cobhan: Cobhan
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.cobhan = Cobhan()
+        return super().setUpClass()
+
+    def temp_file_buf(self, data_bytes: bytes) -> Tuple[Any, str]:
+        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+            temp_file.write(data_bytes)
+        file_name = temp_file.name.encode("utf8")
+        buf = self.cobhan.bytearray_to_buf(file_name)
+        # A negative length marks the payload as the name of a temporary file
+        buf[0:4] = (-len(file_name)).to_bytes(4, byteorder="little", signed=True)
+        return buf, temp_file.name
+
+    def test_temp_file_is_read_into_bytearray(self):
+        data_bytes = "foobar".encode("utf8") * 1000
+        buf, file_name = self.temp_file_buf(data_bytes)
+        self.assertEqual(self.cobhan.buf_to_bytearray(buf), data_bytes)
+        self.assertFalse(os.path.exists(file_name))
+
+    def test_temp_file_is_read_into_string(self):
+        buf, _ = self.temp_file_buf("foobar".encode("utf8"))
+        self.assertEqual(self.cobhan.buf_to_str(buf), "foobar")
+
+
+class IntTests(TestCase):
+    cobhan: Cobhan
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.cobhan = Cobhan()
+        return super().setUpClass()
+
+    def test_buffer_holds_int64(self):
+        buf = self.cobhan.int_to_buf(1)
+        self.assertEqual(len(buf), 8)
+
+    def test_two_way_conversion_maintains_int(self):
+        for num in (0, 1, -1, 2**62, -(2**63)):
+            with self.subTest(num=num):
+                buf = self.cobhan.int_to_buf(num)
+                self.assertEqual(self.cobhan.buf_to_int(buf), num)
+
+
+class PoolTests(TestCase):
+    def setUp(self) -> None:
+        self.cobhan = Cobhan()
+        return super().setUp()
+
+    def test_released_buffer_is_reused(self):
+        buf = self.cobhan.str_to_buf("foobar")
+        self.cobhan.release_buf(buf)
+        self.assertIs(self.cobhan.allocate_buf(0), buf)
+
+    def test_reused_buffer_is_reinitialized(self):
+        buf = self.cobhan.str_to_buf("foobar")
+        self.cobhan.release_buf(buf)
+        result = self.cobhan.bytearray_to_buf(b"foo")
+        self.assertIs(result, buf)
+        self.assertEqual(self.cobhan.buf_to_bytearray(result), b"foo")
+
+    def test_reused_buffer_does_not_expose_previous_payload(self):
+        buf = self.cobhan.str_to_buf("secret")
+        self.cobhan.release_buf(buf)
+        result = self.cobhan.allocate_buf(0)
+        self.assertIs(result, buf)
+        self.assertEqual(self.cobhan.buf_to_str(result), "\0" * 1024)
+
+    def test_non_cobhan_buffer_is_not_pooled(self):
+        buf = bytearray(self.cobhan.minimum_allocation)
+        self.cobhan.release_buf(buf)
+        self.assertIsNot(self.cobhan.allocate_buf(0), buf)
+
+    def test_released_buffer_is_only_reused_for_same_size(self):
+        buf = self.cobhan.allocate_buf(0)
+        self.cobhan.release_buf(buf)
+        self.assertIsNot(self.cobhan.allocate_buf(2048), buf)
+
+    def test_larger_buffer_is_not_pooled(self):
+        buf = self.cobhan.allocate_buf(2048)
+        self.cobhan.release_buf(buf)
+        self.assertIsNot(self.cobhan.allocate_buf(2048), buf)
+
+    def test_buffer_released_twice_is_only_reused_once(self):
+        buf = self.cobhan.allocate_buf(0)
+        self.cobhan.release_buf(buf)
+        self.cobhan.release_buf(buf)
+        self.assertIs(self.cobhan.allocate_buf(0), buf)
+        self.assertIsNot(self.cobhan.allocate_buf(0), buf)
+
+    def test_pool_size_is_limited(self):
+        bufs = [self.cobhan.allocate_buf(0) for _ in range(32)]
+        for buf in bufs:
+            self.cobhan.release_buf(buf)
+        reused = [self.cobhan.allocate_buf(0) for _ in range(32)]
+        reused_ids = {id(buf) for buf in reused} & {id(buf) for buf in bufs}
+        self.assertEqual(len(reused_ids), 16)
+
+
+class JsonTests(TestCase):
+    cobhan: Cobhan
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.cobhan = Cobhan()
+        return super().setUpClass()
+
+    def test_two_way_conversion_maintains_object(self):
+        obj = {"foo": "bar", "baz": [1, 2.5, None, True]}
+        buf = self.cobhan.to_json_buf(obj)
+        result = self.cobhan.from_json_buf(buf)
+        self.assertEqual(result, obj)
+
+    def test_two_way_conversion_maintains_non_ascii_object(self):
+        obj = {"foo": "b\u00e4r \u2603 \U0001f600"}
+        buf = self.cobhan.to_json_buf(obj)
+        result = self.cobhan.from_json_buf(buf)
+        self.assertEqual(result, obj)
+
+    def test_serialized_buffer_contains_json(self):
+        buf = self.cobhan.to_json_buf({"foo": "bar"})
+        result = self.cobhan.buf_to_str(buf).replace(" ", "")
+        self.assertEqual(result, '{"foo":"bar"}')
+
+    def test_non_string_keys_are_serialized_as_strings(self):
+        buf = self.cobhan.to_json_buf({1: "foo", None: "bar"})
+        result = self.cobhan.from_json_buf(buf)
+        self.assertEqual(result, {"1": "foo", "null": "bar"})
+
+    def test_serialized_buffer_contains_big_int(self):
+        buf = self.cobhan.to_json_buf({"foo": 2**70})
+        result = self.cobhan.buf_to_str(buf).replace(" ", "")
+        self.assertEqual(result, '{"foo":1180591620717411303424}')
+
+    def test_nan_is_deserialized(self):
+        buf = self.cobhan.str_to_buf("[NaN]")
+        result = self.cobhan.from_json_buf(buf)
+        self.assertTrue(math.isnan(result[0]))
+
+    def test_two_way_conversion_maintains_big_ints(self):
+        obj = [2**70, -(2**63) - 1, 2**64 - 1]
+        buf = self.cobhan.to_json_buf(obj)
+        result = self.cobhan.from_json_buf(buf)
+        self.assertEqual(result, obj)
+        self.assertTrue(all(isinstance(num, int) for num in result))
+
+    def test_two_way_conversion_maintains_non_finite_floats(self):
+        buf = self.cobhan.to_json_buf([math.nan, math.inf, None])
+        result = self.cobhan.from_json_buf(buf)
+        self.assertTrue(math.isnan(result[0]))
+        self.assertEqual(result[1:], [math.inf, None])
+
+
+# Runs the JSON tests again without orjson, as if it were not installed
+@mock.patch("cobhan.cobhan._orjson", None)
+class JsonWithoutOrjsonTests(JsonTests):
+    pass